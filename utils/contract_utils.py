@@ -13,22 +13,35 @@ This module focuses on:
 
 import os
 import json
+import hashlib
+import functools
 import subprocess
 import tomllib
+import tempfile
 import solcx
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 # Constants for solcx output keys
 KEY_abi = "abi"
 KEY_bin = "bin"
 KEY_metadata = "metadata"
+KEY_ast = "ast"
+# Keys of an on-disk solc cache entry. The compiler version is stored, so a cache hit doesn't need solc at all
+KEY_compiler_version = "compiler_version"
+KEY_contracts = "contracts"
 
 
 def flatten_contract(contract_path: str) -> str:
     """
     Flattens a Solidity contract using Foundry's `forge flatten`.
     Returns the flattened Solidity code as a string.
+    Memoized per (path, mtime), so an unchanged file costs an `os.stat` instead of a forge subprocess.
     """
+    return _flatten_cached(contract_path, os.path.getmtime(contract_path))
+
+
+@functools.lru_cache(maxsize=32)
+def _flatten_cached(contract_path: str, mtime: float) -> str:
     try:
         result = subprocess.run(
             ["forge", "flatten", contract_path],
@@ -41,14 +54,25 @@ def flatten_contract(contract_path: str) -> str:
         raise RuntimeError(f"Flattening failed: {e.stderr}")
 
 
+@functools.lru_cache(maxsize=None)
+def solc_version_string(version: str) -> str:
+    """
+    Returns the full compiler version of an installed solc, as Etherscan expects it (e.g., "v0.8.20+commit.a1b79de6").
+    Runs `solc --version` once per version.
+    """
+    solc_binary = solcx.install.get_executable(version)
+    return "v" + str(solcx.wrapper.get_solc_version(solc_binary, with_commit_hash=True))
+
+
 def compile_contract(
         contract_path: str,
         version: str,
         contract_name: Optional[str] = None,
         output_values: Optional[List[str]] = None,
-        optimize: bool = True,
-        optimizer_runs: int = 200,
-        toml_file_path: Optional[str] = "foundry.toml"
+        optimize: Optional[bool] = True,
+        optimizer_runs: Optional[int] = 200,
+        toml_file_path: Optional[str] = "foundry.toml",
+        cache_dir: Optional[str] = "./.solc_cache"
 ) -> Dict[str, Any]:
     """
     Compiles a Solidity contract and returns deployment + verification artifacts.
@@ -71,20 +95,22 @@ def compile_contract(
         If `None`, the first contract in the file is used.
     output_values : Optional[List[str]], default=None
         Compilation outputs to retrieve. Defaults to `["abi", "bin"]`.
-        "metadata" is always appended internally for debugging & verification.
-    optimize : bool, default=True
-        Whether to enable Solidity optimizer.
-    optimizer_runs : int, default=200
-        Number of optimizer runs (used if optimizer is enabled).
+        "metadata" is appended internally only when compiler settings must be read back from it.
+    optimize : Optional[bool], default=True
+        Whether to enable Solidity optimizer. `None` leaves it to solc and reads the setting from metadata.
+    optimizer_runs : Optional[int], default=200
+        Number of optimizer runs (used if optimizer is enabled). `None` leaves it to solc, as above.
     toml_file_path : Optional[str], default=foundry.toml
         Path to `foundry.toml` file to load remappings for import resolution.
+    cache_dir : Optional[str], default="./.solc_cache"
+        Directory to cache solc output, keyed by source + compiler settings. `None` disables the cache.
 
     Returns
     -------
     Dict[str, Any]
         Dictionary containing:
         - "contract_name": str -> Name of the compiled contract
-        - "compiler_version": str -> Solidity version (e.g., "v0.8.20")
+        - "compiler_version": str -> Solidity version (e.g., "v0.8.20+commit.a1b79de6")
         - "optimize": int -> Optimizer enabled flag (0 or 1)
         - "optimizer_runs": int -> Number of optimizer runs
         - "contract_source": str -> Raw Solidity source code
@@ -95,18 +121,197 @@ def compile_contract(
     Notes
     -----
     - Automatically loads import remappings from `foundry.toml` if present.
-    - Adds `metadata` to the compilation outputs internally for richer debugging
-      and to extract compiler settings for verification (but removes it from final return).
+    - Compiler settings for verification are taken from the arguments, and the exact compiler version
+      (with commit hash, as Etherscan expects) from the solc binary. `metadata` is only requested and
+      parsed when `optimize` or `optimizer_runs` is `None` (and removed from the final return).
+    - The solc output (and full compiler version) is cached on disk under `cache_dir`, keyed by sha256 of
+      (source, version, optimizer settings, output values, remappings), so a cache hit doesn't need solc
+      installed. Imported files are not part of the key, so clear the cache after editing a dependency.
+    - Results are also memoized in-process per (path, mtime, arguments), so repeated calls within a
+      script (e.g., load_deployed_contract + deploy_and_verify) don't even re-read the source. ABI and
+      bytecode are always compiled together for this, and outputs not asked for are dropped from the result.
     - Use the returned dictionary directly for deployment (ABI + bytecode) and
       Etherscan V2 verification API payloads.
     """
-    remove_fields = []
     if output_values is None:
         output_values = [KEY_abi, KEY_bin]  # Default to ABI + bytecode
-    if KEY_metadata not in output_values:
-        output_values.append(KEY_metadata)  # Ensure metadata is always available
+    # Always compile at least ABI + bytecode, so an ABI-only caller shares the memo (and disk) entry with deployers
+    compiled_values = set(output_values) | {KEY_abi, KEY_bin}
+    result = _compile_contract_cached(
+        contract_path, os.path.getmtime(contract_path), version, contract_name, tuple(sorted(compiled_values)),
+        optimize, optimizer_runs, toml_file_path, cache_dir
+    )
+    # Copy (so callers can't alter the cached entry) without the outputs this caller didn't ask for
+    not_requested = compiled_values - set(output_values)
+    return {k: v for k, v in result.items() if k not in not_requested}
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_contract_cached(
+        contract_path: str,
+        mtime: float,  # Only part of the cache key, so an edited file gets recompiled
+        version: str,
+        contract_name: Optional[str],
+        output_values: Tuple[str, ...],
+        optimize: Optional[bool],
+        optimizer_runs: Optional[int],
+        toml_file_path: Optional[str],
+        cache_dir: Optional[str]
+) -> Dict[str, Any]:
+    output_values, remove_fields = _solc_output_values(output_values, optimize, optimizer_runs)
+    remappings = _load_remappings(toml_file_path)
+
+    with open(contract_path, 'r', encoding="utf-8") as file:
+        contract_source = file.read()
+
+    cache_path = _solc_cache_path(
+        cache_dir, contract_source, version, optimize, optimizer_runs, output_values, remappings
+    )
+    cached = _read_solc_cache(cache_path)
+    if cached is not None:
+        compiled_sol, compiler_version = cached[KEY_contracts], cached[KEY_compiler_version]
+        print(f'[INFO] Loaded compiled output of {contract_path} from cache: {cache_path}')
+    else:
+        compiled_sol = solcx.compile_source(
+            contract_source,
+            import_remappings=remappings,
+            output_values=output_values,
+            solc_version=version,
+            optimize=optimize,
+            optimize_runs=optimizer_runs
+        )
+        compiler_version = solc_version_string(version)
+        _write_solc_cache(cache_path, {KEY_compiler_version: compiler_version, KEY_contracts: compiled_sol})
+
+    return _build_result(
+        contract_path, contract_source, compiled_sol, contract_name, compiler_version, optimize, optimizer_runs,
+        remove_fields
+    )
+
+
+def compile_contracts(
+        contract_paths: List[str],
+        version: str,
+        output_values: Optional[List[str]] = None,
+        optimize: Optional[bool] = True,
+        optimizer_runs: Optional[int] = 200,
+        toml_file_path: Optional[str] = "foundry.toml",
+        cache_dir: Optional[str] = "./.solc_cache"
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Compiles several Solidity files in a single `solc` invocation, instead of one `compile_contract` call per file.
+    Saves the solc startup and the re-parsing of shared imports for each file.
+
+    Parameters are the same as `compile_contract`, except `contract_paths` (list of .sol files) and no
+    `contract_name`: the first contract declared in each file is picked.
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]]
+        Maps each given path to the same result dictionary `compile_contract` returns.
+
+    Notes
+    -----
+    - Files already in the on-disk solc cache are not recompiled. Batch entries are kept apart from
+      `compile_contract` ones (marked in the cache key): solc sees the real file path instead of `<stdin>`,
+      which changes the metadata hash embedded in the bytecode and how relative imports resolve.
+    - So results are not shared with `compile_contract`, neither through the disk cache nor its in-process memo.
+    """
+    if output_values is None:
+        output_values = [KEY_abi, KEY_bin]  # Default to ABI + bytecode
+    output_values, remove_fields = _solc_output_values(output_values, optimize, optimizer_runs)
+    remappings = _load_remappings(toml_file_path)
+
+    sources, cache_paths, compiled, compiler_versions = {}, {}, {}, {}
+    for path in contract_paths:
+        with open(path, 'r', encoding="utf-8") as file:
+            sources[path] = file.read()
+        cache_paths[path] = _solc_cache_path(
+            cache_dir, sources[path], version, optimize, optimizer_runs, output_values, remappings, batch=True
+        )
+        cached = _read_solc_cache(cache_paths[path])
+        if cached is not None:
+            compiled[path], compiler_versions[path] = cached[KEY_contracts], cached[KEY_compiler_version]
+            print(f'[INFO] Loaded compiled output of {path} from cache: {cache_paths[path]}')
+
+    to_compile = [path for path in contract_paths if path not in compiled]
+    if to_compile:
+        # The AST tells which source units each file imports, so a file's cache entry holds its own and imported
+        # units only, and doesn't depend on which other files happened to be in the same batch
+        ast_requested = KEY_ast in output_values
+        compiled_files = solcx.compile_files(
+            to_compile,
+            import_remappings=remappings,
+            output_values=output_values if ast_requested else output_values + [KEY_ast],
+            solc_version=version,
+            optimize=optimize,
+            optimize_runs=optimizer_runs
+        )
+        compiler_version = solc_version_string(version)
+        asts = {}
+        for key, data in compiled_files.items():
+            asts[key.rsplit(":", 1)[0]] = data[KEY_ast] if ast_requested else data.pop(KEY_ast)
+
+        for path in to_compile:
+            # This file's own contracts go first, so the first one is picked by _build_result
+            own_keys = [key for key in compiled_files if _same_file(key.rsplit(":", 1)[0], path)]
+            compiler_versions[path] = compiler_version
+            compiled[path] = {key: compiled_files[key] for key in own_keys}
+            units = _imported_units([key.rsplit(":", 1)[0] for key in own_keys], asts)
+            if units is None:
+                continue  # Can't tell this file's imports apart from the rest of the batch, so don't cache it
+            compiled[path].update({
+                k: v for k, v in compiled_files.items() if k not in own_keys and k.rsplit(":", 1)[0] in units
+            })
+            _write_solc_cache(
+                cache_paths[path], {KEY_compiler_version: compiler_version, KEY_contracts: compiled[path]}
+            )
+
+    return {
+        path: _build_result(
+            path, sources[path], compiled[path], None, compiler_versions[path], optimize, optimizer_runs, remove_fields
+        ) for path in contract_paths
+    }
+
+
+def _same_file(source_unit: str, path: str) -> bool:
+    # solc may report a source unit relative to its base path (cwd), while callers may pass absolute paths
+    return os.path.normpath(os.path.abspath(source_unit)) == os.path.normpath(os.path.abspath(path))
+
+
+def _imported_units(own_units: List[str], asts: Dict[str, Any]) -> Optional[set]:
+    """
+    Returns the given source units plus every unit they import, transitively, by following ImportDirective
+    nodes of their ASTs. Returns None if a unit's AST is unknown (e.g. it declares no contract).
+    """
+    seen, pending = set(own_units), list(own_units)
+    if not pending:
+        return None
+    while pending:
+        ast = asts.get(pending.pop())
+        if ast is None:
+            return None
+        for node in ast.get("nodes", []):
+            if node.get("nodeType") == "ImportDirective" and node["absolutePath"] not in seen:
+                seen.add(node["absolutePath"])
+                pending.append(node["absolutePath"])
+    return seen
+
+
+def _solc_output_values(
+        output_values: Tuple[str, ...], optimize: Optional[bool], optimizer_runs: Optional[int]
+) -> Tuple[List[str], List[str]]:
+    """
+    Returns the solc output values to request, and the fields to strip from the result as they're only used internally.
+    """
+    output_values, remove_fields = list(output_values), []
+    if (optimize is None or optimizer_runs is None) and KEY_metadata not in output_values:
+        output_values.append(KEY_metadata)  # Needed to read back solc's default settings
         remove_fields.append(KEY_metadata)
+    return output_values, remove_fields
+
 
+def _load_remappings(toml_file_path: Optional[str]) -> Optional[List[str]]:
     remappings = None
     if os.path.exists(toml_file_path):
         with open(toml_file_path, "rb") as f:
@@ -118,19 +323,84 @@ def compile_contract(
                 print(f'[WARN] No remappings found in {toml_file_path}')
     else:
         print(f'[WARN] file {toml_file_path} Not found to load remappings')
+    return remappings
 
-    with open(contract_path, 'r', encoding="utf-8") as file:
-        contract_source = file.read()
 
-    compiled_sol = solcx.compile_source(
-        contract_source,
-        import_remappings=remappings,
-        output_values=output_values,
-        solc_version=version,
-        optimize=optimize,
-        optimize_runs=optimizer_runs
-    )
+def _solc_cache_path(
+        cache_dir: Optional[str],
+        contract_source: str,
+        version: str,
+        optimize: Optional[bool],
+        optimizer_runs: Optional[int],
+        output_values: List[str],
+        remappings: Optional[List[str]],
+        batch: bool = False  # compile_files output differs from compile_source's, so it gets its own entries
+) -> Optional[str]:
+    if not cache_dir:
+        return None
+    key_parts = [contract_source, version, optimize, optimizer_runs, sorted(output_values), remappings]
+    if batch:
+        key_parts.append("compile_files")  # Appended only for batch, so existing compile_contract keys don't change
+    key = hashlib.sha256(json.dumps(key_parts, sort_keys=True).encode()).hexdigest()
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, f"{key}.json")
 
+
+def _read_solc_cache(cache_path: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Returns the cached entry {"compiler_version", "contracts": solc output}, or None on a miss.
+    An unreadable (e.g. truncated) or old-format entry counts as a miss.
+    """
+    entry = read_json_cache(cache_path)
+    if not isinstance(entry, dict) or KEY_contracts not in entry or KEY_compiler_version not in entry:
+        return None
+    return entry
+
+
+def _write_solc_cache(cache_path: Optional[str], entry: Dict[str, Any]) -> None:
+    if cache_path:
+        write_json_atomic(cache_path, entry)
+
+
+def read_json_cache(cache_path: Optional[str]) -> Optional[Any]:
+    """
+    Loads a JSON cache file, or returns None if it doesn't exist. An unreadable (e.g. truncated) file counts as a miss.
+    """
+    if not cache_path or not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f'[WARN] Ignoring corrupt cache file {cache_path}')
+        return None
+
+
+def write_json_atomic(path: str, data: Any, **dump_kwargs) -> None:
+    """
+    Writes JSON to a temp file and renames it over `path`, so an interrupted or concurrent run never leaves
+    a partial file behind.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, **dump_kwargs)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _build_result(
+        contract_path: str,
+        contract_source: str,
+        compiled_sol: Dict[str, Any],
+        contract_name: Optional[str],
+        compiler_version: str,
+        optimize: Optional[bool],
+        optimizer_runs: Optional[int],
+        remove_fields: List[str]
+) -> Dict[str, Any]:
     # Resolve the contract name (pick the first if not specified)
     if contract_name:
         contract_name = next(key for key in compiled_sol if key.endswith(f":{contract_name}"))
@@ -138,15 +408,18 @@ def compile_contract(
         contract_name = next(iter(compiled_sol))
     print(f'[INFO] Compiled {contract_path} for contract {contract_name}')
 
-    # Extract metadata for compiler settings (useful for verification)
-    metadata = json.loads(compiled_sol[contract_name][KEY_metadata])
+    if optimize is None or optimizer_runs is None:
+        # Extract compiler settings left to solc defaults (needed for verification)
+        metadata = json.loads(compiled_sol[contract_name][KEY_metadata])
+        optimize = metadata["settings"]["optimizer"]["enabled"]
+        optimizer_runs = metadata["settings"]["optimizer"]["runs"]
 
     # Prepare result dictionary
     result = {
         "contract_name": contract_name.split(":")[-1],
-        "compiler_version": "v" + metadata["compiler"]["version"],
-        "optimize": 1 if metadata["settings"]["optimizer"]["enabled"] else 0,
-        "optimizer_runs": metadata["settings"]["optimizer"]["runs"],
+        "compiler_version": compiler_version,
+        "optimize": 1 if optimize else 0,
+        "optimizer_runs": optimizer_runs,
         "contract_source": contract_source
     }
     # Add all requested fields except metadata
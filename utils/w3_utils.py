@@ -2,41 +2,90 @@
 This module provides utility functions for interacting with the Ethereum blockchain using Web3.py.
 It includes functions for compiling Solidity contracts, sending transactions,
 encoding constructor arguments, and deploying and verifying contracts on Etherscan.
+Keccak-256 hashing uses pycryptodome's native backend (`eth-hash[pycryptodome]`); set ETH_HASH_BACKEND to override.
 """
+import functools
 import json
 import os
+import threading
 import time
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from dotenv import load_dotenv
 from eth_abi import encode
+from eth_hash.utils import auto_choose_backend
 from eth_utils import to_hex
-from web3 import Web3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from web3 import AsyncWeb3, Web3, WebSocketProvider
 
-from utils.contract_utils import compile_contract, flatten_contract
+from utils.contract_utils import compile_contract, flatten_contract, read_json_cache, write_json_atomic
 
 load_dotenv('.env')
 
-# Initialize Web3 connection
-w3 = Web3(Web3.HTTPProvider(os.getenv('PROVIDER_URL')))
-if w3.is_connected():
-    print("Successfully connected to the provider!")
-else:
-    print("Failed to connect to the given provider ", os.getenv('PROVIDER_URL'))
-    exit()
+# eth_hash picks its backend lazily on the first hash, so this must run before any keccak (topics, checksums)
+os.environ.setdefault("ETH_HASH_BACKEND", "pycryptodome")
+# Resolves the same backend eth_hash.auto will load from ETH_HASH_BACKEND, failing early if it isn't installed
+print(f"Selected Keccak-256 backend (ETH_HASH_BACKEND): {type(auto_choose_backend()).__module__}")
+
+# Web3 connection goes over a keep-alive session with a larger pool, retrying rate-limits and connect failures
+_RPC_SESSION = requests.Session()
+_RPC_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=32,
+    # Every JSON-RPC call is a POST, including eth_sendRawTransaction. So only retry where the node surely didn't
+    # process the request (connect errors, 429, 503): retrying a 502 or a read error may re-broadcast a tx that
+    # went through, and the 'already known'/'nonce too low' reply would make submit_tx reset its nonce and raise.
+    max_retries=Retry(total=3, connect=3, read=0, other=0, backoff_factor=0.3,
+                      status_forcelist=[429, 503], allowed_methods=["POST"])
+))
+_w3 = None  # Connected lazily by get_w3(), so importing this module doesn't cost an RPC
 
 # Load essential environment variables
 _PRIVATE_KEY = os.getenv('PRIVATE_KEY')
-ACCOUNT1 = w3.to_checksum_address(os.getenv('ACCOUNT1'))
 ETHERSCAN_API_KEY = os.getenv('ETHERSCAN_API_KEY')
 CHAIN_ID = int(os.getenv("CHAIN_ID", 11155111))  # Default to Sepolia testnet
 BASE_URL = f"https://api.etherscan.io/v2/api?chainid={CHAIN_ID}"
 
+# Shared session for Etherscan calls: keep-alive reuses TCP+TLS connections, and transient errors are retried
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+))
+
 # Web3 specific constants
 _IMPL_SLOT = int(Web3.keccak(text="eip1967.proxy.implementation").hex(), 16) - 1  # should give below
 # slot = "0x360894a13ba1a3210667c828492db98dca3e2076cc3735a920a3ca505d382bbc"
 
+# Multicall3 is deployed at the same address on mainnet, Sepolia and most EVM chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+_MULTICALL3_ABI = [{
+    "type": "function",
+    "name": "aggregate3",
+    "stateMutability": "payable",
+    "inputs": [{
+        "type": "tuple[]", "name": "calls", "components": [
+            {"type": "address", "name": "target"},
+            {"type": "bool", "name": "allowFailure"},
+            {"type": "bytes", "name": "callData"}
+        ]
+    }],
+    "outputs": [{
+        "type": "tuple[]", "name": "returnData", "components": [
+            {"type": "bool", "name": "success"},
+            {"type": "bytes", "name": "returnData"}
+        ]
+    }]
+}]
+_decimals_cache = {}  # token address -> decimals(), which never changes for a deployed token
+_proxy_impl_cache = {}  # proxy address -> {"impl_address", "abi", "fetched_at"}, mirrors ./.proxy_cache
+PROXY_CACHE_TTL = 3600  # Seconds after which a cached proxy implementation is looked up again (upgrades are rare)
+_nonce_lock = threading.Lock()
+_next_nonce = None  # Local nonce counter of ACCOUNT1, synced from the node on first use and after send errors
+
 # Constants used as keys in transactions and API payloads
 KEY_abi = 'abi'
 KEY_bin = "bin"
@@ -47,7 +96,55 @@ KEY_metadata = "metadata"
 KEY_nonce = 'nonce'
 KEY_status = 'status'
 KEY_to = 'to'
-SLEEP_TIME = 5  # Time to wait between retries (in seconds)
+POLL_DELAY_START = 1.0  # First wait before polling verification status (in seconds), grows exponentially
+POLL_DELAY_MAX = 15.0  # Cap on the wait between verification status polls (in seconds)
+
+
+def get_w3():
+    """
+    Returns the shared Web3 connection, connecting to env PROVIDER_URL on first use.
+    `w3` is also available as a module attribute (resolved through this function), e.g. `from utils.w3_utils import w3`
+    """
+    global _w3
+    if _w3 is None:
+        w3 = Web3(Web3.HTTPProvider(os.getenv('PROVIDER_URL'), session=_RPC_SESSION, request_kwargs={"timeout": 30}))
+        if w3.is_connected():
+            print("Successfully connected to the provider!")
+        else:
+            print("Failed to connect to the given provider ", os.getenv('PROVIDER_URL'))
+            exit()
+        _w3 = w3
+    return _w3
+
+
+@functools.cache
+def get_account1():
+    """
+    Returns the checksum address of env ACCOUNT1, also available as module attribute `ACCOUNT1`.
+    """
+    return Web3.to_checksum_address(os.getenv('ACCOUNT1'))
+
+
+def __getattr__(name):
+    # PEP 562: resolves `w3` and `ACCOUNT1` on first access, keeping `from utils.w3_utils import w3, ACCOUNT1` working
+    if name == 'w3':
+        return get_w3()
+    if name == 'ACCOUNT1':
+        return get_account1()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_ws_w3(ws_url: str = None):
+    """
+    Builds an AsyncWeb3 instance over a persistent WebSocket connection (defaults to env WS_PROVIDER_URL).
+    Use it for eth_subscribe, so the node pushes new logs/heads instead of us polling filters over HTTP:
+        async with get_ws_w3() as ws_w3:
+            await ws_w3.eth.subscribe("logs", {"address": contract.address, "topics": [topic0]})
+            async for payload in ws_w3.socket.process_subscriptions():
+                handle_event(payload["result"])
+    The HTTP `w3` from get_w3() is still used for everything else (compile/load contracts, send txs).
+    """
+    return AsyncWeb3(WebSocketProvider(ws_url or os.getenv('WS_PROVIDER_URL')))
 
 
 def send_tx(transaction, build_tx=True):
@@ -60,29 +157,76 @@ def send_tx(transaction, build_tx=True):
         dict: Transaction receipt containing details of the mined transaction.
 
     NOTE: It waits til the transaction is mined and returns the receipt.
-    We have 1-line .transact() for state changes, but it works only if you are using a local node like Ganache, Anvil
+    To keep several txs in flight, use submit_tx() and collect receipts later with await_receipt().
+    """
+    return await_receipt(submit_tx(transaction, build_tx))
+
+
+def submit_tx(transaction, build_tx=True):
+    """
+    Signs and broadcasts a transaction without waiting for it to be mined.
+    Args:
+        transaction (dict): Transaction object to send.
+        build_tx (bool): Whether to build the transaction. Defaults to True.
+    Returns:
+        HexBytes: Transaction hash, to be passed to await_receipt().
+
+    NOTE: We have 1-line .transact() for state changes,
+    but it works only if you are using a local node like Ganache, Anvil
     Or your account is unlocked in the node (like Infura), which is rare in public networks. So we need below steps
+    Nonce is tracked locally after the first tx, to save a get_transaction_count round-trip on every send.
     """
-    nonce = w3.eth.get_transaction_count(ACCOUNT1, 'pending')  # To include unmined txs, Use pending
-    if build_tx:
-        transaction = transaction.build_transaction({
-            KEY_from: ACCOUNT1,
-            KEY_chainId: CHAIN_ID,
-            KEY_nonce: nonce
-        })
-    else:  # For pre-encoded calldata
-        transaction[KEY_chainId] = CHAIN_ID
-        transaction[KEY_from] = ACCOUNT1
-        transaction[KEY_nonce] = nonce
-
-    signed_tx = w3.eth.account.sign_transaction(transaction, private_key=_PRIVATE_KEY)
-    txn_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    global _next_nonce
+    w3, account1 = get_w3(), get_account1()
+    with _nonce_lock:
+        if _next_nonce is None:
+            _next_nonce = w3.eth.get_transaction_count(account1, 'pending')  # To include unmined txs, Use pending
+        nonce = _next_nonce
+        _next_nonce += 1
+    try:
+        if build_tx:
+            transaction = transaction.build_transaction({
+                KEY_from: account1,
+                KEY_chainId: CHAIN_ID,
+                KEY_nonce: nonce
+            })
+        else:  # For pre-encoded calldata
+            transaction[KEY_chainId] = CHAIN_ID
+            transaction[KEY_from] = account1
+            transaction[KEY_nonce] = nonce
+
+        signed_tx = w3.eth.account.sign_transaction(transaction, private_key=_PRIVATE_KEY)
+        txn_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    except Exception:
+        with _nonce_lock:
+            _next_nonce = None  # Unused or stale nonce (e.g. 'nonce too low', 'already known'), so re-sync from node
+        raise
     print(f'Sent transaction to chain {CHAIN_ID} with nonce {nonce} hash {txn_hash}')
-    tx_receipt = w3.eth.wait_for_transaction_receipt(txn_hash)
+    return txn_hash
+
+
+def await_receipt(txn_hash):
+    """
+    Waits til the transaction is mined and asserts it succeeded.
+    Returns: dict: Transaction receipt containing details of the mined transaction.
+    """
+    tx_receipt = get_w3().eth.wait_for_transaction_receipt(txn_hash)
     assert tx_receipt[KEY_status] == 1
     return tx_receipt
 
 
+def sleep_until_next_block(avg_block_s: float = 12):
+    """
+    Sleeps until the next block is expected (latest block timestamp + avg_block_s), instead of a fixed interval.
+    Pollers (logs, receipts, nonces) calling it between iterations query right after a new block, not in between.
+    Args:
+        avg_block_s (float): Average block time of the chain in seconds. Defaults to 12 (Ethereum mainnet/Sepolia).
+    """
+    latest = get_w3().eth.get_block('latest')
+    delay = max(0.5, (latest['timestamp'] + avg_block_s) - time.time())
+    time.sleep(delay)
+
+
 def encode_constructor_args(abi, constructor_args: list = None):
     """
     Encodes constructor arguments for a contract deployment.
@@ -118,7 +262,7 @@ def encode_constructor_args(abi, constructor_args: list = None):
 
 def load_verified_contract(contract_address: str, cache_dir: str = "./.abi_cache"):
     abi = load_verified_contract_abi(contract_address, cache_dir)
-    return w3.eth.contract(address=w3.to_checksum_address(contract_address), abi=abi)
+    return get_w3().eth.contract(address=Web3.to_checksum_address(contract_address), abi=abi)
 
 
 def load_verified_contract_abi(
@@ -130,7 +274,7 @@ def load_verified_contract_abi(
     Returns: ABI of web3.contract.Contract: A Web3 contract object for interacting with the contract.
     Raises: ValueError: If the ABI cannot be fetched from Etherscan.
     """
-    contract_address = w3.to_checksum_address(contract_address)
+    contract_address = Web3.to_checksum_address(contract_address)
     os.makedirs(cache_dir, exist_ok=True)
     cache_path = os.path.join(cache_dir, f"{contract_address}.json")
 
@@ -142,7 +286,7 @@ def load_verified_contract_abi(
     else:
         # Fetch from Etherscan
         url = f"{BASE_URL}&module=contract&action=getabi&address={contract_address}&apikey={ETHERSCAN_API_KEY}"
-        response = requests.get(url)
+        response = _SESSION.get(url)
         data = response.json()
         if data["status"] != "1":
             raise ValueError(f"Failed to fetch ABI for {contract_address}: {data['result']}")
@@ -165,8 +309,8 @@ def load_deployed_contract(
     Returns: web3.contract.Contract: A Web3 contract object for interacting with the deployed contract.
     """
     contract_interface = compile_contract(contract_path, version, contract_name, output_values=[KEY_abi])
-    contract_address = w3.to_checksum_address(contract_address)
-    return w3.eth.contract(address=contract_address, abi=contract_interface[KEY_abi])
+    contract_address = Web3.to_checksum_address(contract_address)
+    return get_w3().eth.contract(address=contract_address, abi=contract_interface[KEY_abi])
 
 
 def get_proxy_impl_address(proxy_address: str):
@@ -176,23 +320,88 @@ def get_proxy_impl_address(proxy_address: str):
         print(f"Implementation of proxy {proxy_address} via implementation() function: {impl_address}")
         return impl_address
 
-    impl_raw = w3.eth.get_storage_at(w3.to_checksum_address(proxy_address), _IMPL_SLOT)
+    impl_raw = get_w3().eth.get_storage_at(Web3.to_checksum_address(proxy_address), _IMPL_SLOT)
     if int(impl_raw.hex(), 16) == 0:  # OR HexBytes("0x0")
         raise Exception(f"Got 0x0 for impl address of proxy {proxy_address}, slot {hex(_IMPL_SLOT)}")
 
-    impl_address = w3.to_checksum_address("0x" + impl_raw.hex()[-40:])
+    impl_address = Web3.to_checksum_address("0x" + impl_raw.hex()[-40:])
     print(f"Implementation of proxy {proxy_address}: {impl_address}")
     return impl_address
 
 
-def load_impl_contract_from_proxy_address(proxy_address: str):
+def load_impl_contract_from_proxy_address(
+        proxy_address: str,  # The Ethereum address of the proxy contract
+        cache_dir: str = "./.proxy_cache",  # Directory to store (implementation address, ABI) per proxy
+        ttl: int = PROXY_CACHE_TTL  # Seconds a cached implementation stays valid
+):
     """
-    Loads a deployed contract by compiling its source code and associating it with the given address.
-    Returns: web3.contract.Contract: A Web3 contract object for interacting with the deployed contract.
+    Loads a proxy contract with the ABI of its implementation, so implementation functions can be called on the proxy.
+    The implementation address and ABI are cached in memory and on disk for `ttl` seconds, to skip both the
+    implementation lookup and the Etherscan ABI fetch on repeated access.
+    Returns: web3.contract.Contract: A Web3 contract object at the proxy address with the implementation's ABI.
+    """
+    proxy_address = Web3.to_checksum_address(proxy_address)
+    cache_path = os.path.join(cache_dir, f"{proxy_address}.json")
+    cached = _proxy_impl_cache.get(proxy_address)
+    if cached is None:
+        cached = read_json_cache(cache_path)
+        if not isinstance(cached, dict) or not {"impl_address", "abi", "fetched_at"} <= cached.keys():
+            cached = None  # Missing, corrupt or incomplete entry, so look it up again
+
+    if cached is None or time.time() - cached["fetched_at"] > ttl:
+        impl_address = get_proxy_impl_address(proxy_address)
+        cached = {
+            "impl_address": impl_address,
+            "abi": load_verified_contract_abi(impl_address),
+            "fetched_at": time.time()
+        }
+        os.makedirs(cache_dir, exist_ok=True)
+        write_json_atomic(cache_path, cached, indent=2)
+    else:
+        print(f"Implementation of proxy {proxy_address} from cache: {cached['impl_address']}")
+
+    _proxy_impl_cache[proxy_address] = cached
+    return get_w3().eth.contract(address=proxy_address, abi=cached["abi"])
+
+
+def batch_call(*contract_functions):
+    """
+    Executes several read-only contract calls as one JSON-RPC batch (single HTTP POST instead of N round-trips).
+    Args:
+        *contract_functions: Bound contract functions, e.g. token.functions.balanceOf(ACCOUNT1)
+    Returns:
+        list: Decoded results, in the same order as the given functions.
+    Example:
+        decimals, balance, allowance = batch_call(
+            link.functions.decimals(), link.functions.balanceOf(sender), usdc.functions.allowance(ACCOUNT1, sender))
+    """
+    with get_w3().batch_requests() as batch:
+        for fn in contract_functions:
+            batch.add(fn)
+        return batch.execute()
+
+
+def token_decimals(token_contract):
+    """
+    Returns decimals() of an ERC20 token contract. It is immutable, so only the first call per address hits the RPC.
+    """
+    if token_contract.address not in _decimals_cache:
+        _decimals_cache[token_contract.address] = token_contract.functions.decimals().call()
+    return _decimals_cache[token_contract.address]
+
+
+def multicall(calls: list):
+    """
+    Aggregates several read-only calls into a single eth_call through Multicall3's aggregate3.
+    Any reverting call reverts the whole multicall.
+    Args:
+        calls (list): (target_address, calldata) tuples, calldata built like token.encode_abi("balanceOf", [owner])
+    Returns:
+        list: Raw return data (bytes) per call, in order. Decode with eth_abi, e.g. decode(["uint256"], data)[0]
     """
-    impl_address = get_proxy_impl_address(proxy_address)
-    impl_contract_abi = load_verified_contract_abi(impl_address)
-    return w3.eth.contract(address=w3.to_checksum_address(proxy_address), abi=impl_contract_abi)
+    multicall3 = get_w3().eth.contract(address=MULTICALL3_ADDRESS, abi=_MULTICALL3_ABI)
+    aggregated = [(Web3.to_checksum_address(target), False, calldata) for target, calldata in calls]
+    return [return_data for _, return_data in multicall3.functions.aggregate3(aggregated).call()]
 
 
 def deploy_and_verify(
@@ -216,10 +425,14 @@ def deploy_and_verify(
         web3.eth.Contract: Web3 contract object for the deployed contract.
     """
     compiled = compile_contract(contract_path, version, contract_name)
+    # Run 'forge flatten' in background, so it overlaps with deployment and the wait below
+    executor = ThreadPoolExecutor(max_workers=1)
+    flattened_future = executor.submit(flatten_contract, contract_path)
+    executor.shutdown(wait=False)
     if contract_address:
         print(f"Preparing to verify contract at address {contract_address}")
     else:
-        contract = w3.eth.contract(abi=compiled[KEY_abi], bytecode=compiled[KEY_bin])
+        contract = get_w3().eth.contract(abi=compiled[KEY_abi], bytecode=compiled[KEY_bin])
         if constructor_args:
             tx_receipt = send_tx(contract.constructor(*constructor_args))
         else:
@@ -242,14 +455,14 @@ def deploy_and_verify(
         "optimizationUsed": compiled["optimize"],
         "runs": compiled["optimizer_runs"],
         # "sourceCode": compiled["contract_source"],
-        "sourceCode": flatten_contract(contract_path),
+        "sourceCode": flattened_future.result(),
         "apikey": ETHERSCAN_API_KEY
     }
     if constructor_args:
         payload["constructorArguments"] = encode_constructor_args(compiled[KEY_abi], constructor_args)
     print(f"Verifying the contract using payload {payload}")
 
-    resp = requests.post(BASE_URL, data=payload)
+    resp = _SESSION.post(BASE_URL, data=payload)
     result = resp.json()
     print("Initial response:", result)
 
@@ -258,16 +471,18 @@ def deploy_and_verify(
     guid = result["result"]
     print("Verification submission successful, GUID:", guid)
 
-    # Poll for verification result
-    for _ in range(10):
-        sleep(SLEEP_TIME)
+    # Poll for verification result with exponential backoff, as it usually completes within a few seconds
+    delay = POLL_DELAY_START
+    for _ in range(12):
+        time.sleep(delay)
+        delay = min(delay * 1.8, POLL_DELAY_MAX)
         status_payload = {
             "module": "contract",
             "action": "checkverifystatus",
             "guid": guid,
             "apikey": ETHERSCAN_API_KEY
         }
-        status_resp = requests.get(BASE_URL, params=status_payload)
+        status_resp = _SESSION.get(BASE_URL, params=status_payload)
         status = status_resp.json()
         print("Verification check:", status)
 
@@ -276,9 +491,8 @@ def deploy_and_verify(
             break
         if "Pending" in status["result"]:
             print("🔄 Verification is still pending, waiting...")
-            time.sleep(SLEEP_TIME)
         else:
             print("❌ Verification failed:", status)
             raise Exception("❌ Verification failed: " + status["result"])
 
-    return w3.eth.contract(address=contract_address, abi=compiled[KEY_abi])
+    return get_w3().eth.contract(address=contract_address, abi=compiled[KEY_abi])